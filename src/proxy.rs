@@ -1,5 +1,5 @@
 use axum::{
-    extract::{Request, State},
+    extract::{Path, Request, State},
     http::{HeaderMap, StatusCode},
     middleware::{self, Next},
     response::{IntoResponse, Response},
@@ -242,6 +242,30 @@ pub async fn health_check() -> impl IntoResponse {
     }))
 }
 
+pub async fn get_model(
+    State(state): State<AppState>,
+    Path(nickname): Path<String>,
+) -> Result<Json<Value>, (StatusCode, Json<Value>)> {
+    // Lightweight nickname lookup so clients can check resolution without
+    // paying for an inference round-trip
+    match state.settings.model_map.get(&nickname) {
+        Some(model) => Ok(Json(json!({
+            "type": "model",
+            "id": model,
+            "nickname": nickname
+        }))),
+        None => Err((
+            StatusCode::NOT_FOUND,
+            Json(json!({
+                "error": {
+                    "type": "not_found_error",
+                    "message": format!("Unknown model nickname: {}", nickname)
+                }
+            })),
+        )),
+    }
+}
+
 pub async fn auth_status(State(state): State<AppState>) -> impl IntoResponse {
     let status = state.oauth_manager.storage().get_status();
     Json(status)
@@ -631,6 +655,7 @@ async fn api_key_auth(
 pub fn create_router(state: AppState) -> Router {
     let protected_routes = Router::new()
         .route("/v1/messages", post(anthropic_messages))
+        .route("/v1/models/:nickname", get(get_model))
         .layer(middleware::from_fn_with_state(state.clone(), api_key_auth));
 
     Router::new()
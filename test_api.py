@@ -3,6 +3,7 @@ Comprehensive API test suite for Maximize proxy
 Tests model nicknames, streaming, authentication, and endpoints
 """
 from anthropic import Anthropic
+import httpx
 import requests
 import sys
 import os
@@ -15,6 +16,14 @@ load_dotenv()
 BASE_URL = os.getenv("MAXIMIZE_BASE_URL", "http://localhost:8081")
 API_KEY = os.getenv("MAXIMIZE_API_KEY", "dummy")  # Use env var or default
 
+# Shared client so every test reuses the same keep-alive connections
+CLIENT = Anthropic(
+    api_key=API_KEY,
+    base_url=BASE_URL,
+    max_retries=2,
+    timeout=httpx.Timeout(30.0, connect=5.0)
+)
+
 # Colors for terminal output
 class Colors:
     GREEN = '\033[92m'
@@ -156,12 +165,7 @@ def test_model_nonstreaming(nickname: str, prompt: str) -> bool:
     print_info(f"Prompt: {prompt}")
     
     try:
-        client = Anthropic(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        
-        message = client.messages.create(
+        message = CLIENT.messages.create(
             model=nickname,
             max_tokens=100,
             messages=[{"role": "user", "content": prompt}],
@@ -193,16 +197,11 @@ def test_model_streaming(nickname: str, prompt: str) -> bool:
     print_info(f"Prompt: {prompt}")
     
     try:
-        client = Anthropic(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        
         chunks = []
         sys.stdout.write(f"{Colors.BLUE}ℹ️  Streaming response: {Colors.RESET}")
         sys.stdout.flush()
         
-        with client.messages.stream(
+        with CLIENT.messages.stream(
             model=nickname,
             max_tokens=100,
             messages=[{"role": "user", "content": prompt}]
@@ -238,13 +237,8 @@ def test_model_nicknames() -> bool:
     for nickname in nicknames:
         print_info(f"Testing nickname: {nickname}")
         try:
-            client = Anthropic(
-                api_key=API_KEY,
-                base_url=BASE_URL
-            )
-            
             # Very short request to test nickname resolution
-            message = client.messages.create(
+            message = CLIENT.messages.create(
                 model=nickname,
                 max_tokens=10,
                 messages=[{"role": "user", "content": "Hi"}]
@@ -273,12 +267,7 @@ def test_extended_thinking() -> bool:
     print_header("Test 7: Extended Thinking Mode")
     
     try:
-        client = Anthropic(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        
-        message = client.messages.create(
+        message = CLIENT.messages.create(
             model="l",  # Sonnet 4 supports thinking
             max_tokens=2000,
             thinking={
@@ -391,3 +380,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}Test suite interrupted{Colors.RESET}")
         sys.exit(1)
+    finally:
+        CLIENT.close()
@@ -2,11 +2,20 @@
 Comprehensive API test suite for Maximize proxy
 Tests model nicknames, streaming, authentication, and endpoints
 """
-from anthropic import Anthropic
+from anthropic import Anthropic, APITimeoutError
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from functools import lru_cache
+import httpx
+import io
+import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sys
 import os
-from typing import Optional
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +23,42 @@ load_dotenv()
 # Configuration
 BASE_URL = os.getenv("MAXIMIZE_BASE_URL", "https://maximize.automa.016180.xyz")
 API_KEY = os.getenv("MAXIMIZE_API_KEY", "max-5763-2548-9184-0810-2743-7182-4371-2878-9576-8768")  # Use env var or default
+TEST_TIMEOUT = 45  # Seconds before a test is abandoned and counted as failed
+
+# Shared clients so every test reuses the same keep-alive connections
+# instead of paying a fresh TCP + TLS handshake per request
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,  # Keep a connection per concurrent test instead of discarding extras
+    max_retries=Retry(total=2, backoff_factor=0.1)
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# The health check gates the suite, so it must fail fast: no retries
+HEALTH_SESSION = requests.Session()
+CLIENT = Anthropic(
+    api_key=API_KEY,
+    base_url=BASE_URL,
+    max_retries=2,
+    # Read is generous because non-streaming thinking requests send nothing
+    # until the whole response is ready
+    timeout=httpx.Timeout(connect=3.0, read=30.0, write=5.0, pool=2.0)
+)
+# Tests run under TEST_TIMEOUT and may be abandoned mid-request, so they
+# must not retry: a retry would send another (billed) request after the
+# suite has already counted the test as failed
+NO_RETRY_CLIENT = CLIENT.with_options(max_retries=0)
+
+# Request used by the API key test, sent both with and without credentials
+_PROBE_BODY = json.dumps({
+    "model": "l",
+    "max_tokens": 10,
+    "messages": [{"role": "user", "content": "test"}]
+}).encode()
+_PROBE_HEADERS = {"Content-Type": "application/json"}
+_PROBE_HEADERS_AUTH = {**_PROBE_HEADERS, "Authorization": f"Bearer {API_KEY}"}
 
 # Colors for terminal output
 class Colors:
@@ -25,27 +70,68 @@ class Colors:
     RESET = '\033[0m'
     BOLD = '\033[1m'
 
+# Drop colors when output is piped (CI logs, files) rather than a terminal
+if not sys.stdout.isatty():
+    for _name in [n for n in vars(Colors) if n.isupper()]:
+        setattr(Colors, _name, "")
+
+# Prefixes for the print helpers, built once instead of on every call
+_HEADER_PREFIX = f"{Colors.CYAN}{Colors.BOLD}"
+_HEADER_RULE = f"{_HEADER_PREFIX}{'='*70}{Colors.RESET}"
+_SUCCESS_PREFIX = f"{Colors.GREEN}✅ "
+_ERROR_PREFIX = f"{Colors.RED}❌ "
+_INFO_PREFIX = f"{Colors.BLUE}ℹ️  "
+_WARNING_PREFIX = f"{Colors.YELLOW}⚠️  "
+
+# Tests running in worker threads collect their output here instead of
+# printing directly, so it can be replayed in order once they finish
+_output = threading.local()
+
+def emit(line: str):
+    """Print a line, or buffer it if the current thread is capturing output"""
+    buffer = getattr(_output, "buffer", None)
+    if buffer is not None:
+        buffer.append(line)
+    else:
+        print(line)
+
+def run_captured(name: str, test_func: Callable[[], bool], lines: List[str]) -> bool:
+    """Run a test while capturing its output into lines
+
+    The caller owns lines, so it can still print whatever was captured if
+    the test times out before returning.
+    """
+    _output.buffer = lines
+    try:
+        try:
+            return test_func()
+        except Exception as e:
+            print_error(f"Test '{name}' crashed: {e}")
+            return False
+    finally:
+        _output.buffer = None
+
 def print_header(text: str):
     """Print a formatted header"""
-    print(f"\n{Colors.CYAN}{Colors.BOLD}{'='*70}{Colors.RESET}")
-    print(f"{Colors.CYAN}{Colors.BOLD}{text}{Colors.RESET}")
-    print(f"{Colors.CYAN}{Colors.BOLD}{'='*70}{Colors.RESET}")
+    emit("\n" + _HEADER_RULE)
+    emit(_HEADER_PREFIX + text + Colors.RESET)
+    emit(_HEADER_RULE)
 
 def print_success(text: str):
     """Print success message"""
-    print(f"{Colors.GREEN}✅ {text}{Colors.RESET}")
+    emit(_SUCCESS_PREFIX + text + Colors.RESET)
 
 def print_error(text: str):
     """Print error message"""
-    print(f"{Colors.RED}❌ {text}{Colors.RESET}")
+    emit(_ERROR_PREFIX + text + Colors.RESET)
 
 def print_info(text: str):
     """Print info message"""
-    print(f"{Colors.BLUE}ℹ️  {text}{Colors.RESET}")
+    emit(_INFO_PREFIX + text + Colors.RESET)
 
 def print_warning(text: str):
     """Print warning message"""
-    print(f"{Colors.YELLOW}⚠️  {text}{Colors.RESET}")
+    emit(_WARNING_PREFIX + text + Colors.RESET)
 
 # Test 1: Health Check
 def test_health_check() -> bool:
@@ -54,7 +140,7 @@ def test_health_check() -> bool:
     print_info(f"Testing: GET {BASE_URL}/healthz")
     
     try:
-        response = requests.get(f"{BASE_URL}/healthz", timeout=5)
+        response = HEALTH_SESSION.get(f"{BASE_URL}/healthz", timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -76,7 +162,7 @@ def test_auth_status() -> bool:
     print_info(f"Testing: GET {BASE_URL}/auth/status")
     
     try:
-        response = requests.get(f"{BASE_URL}/auth/status", timeout=5)
+        response = SESSION.get(f"{BASE_URL}/auth/status", timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -110,13 +196,10 @@ def test_api_key_auth() -> bool:
     
     try:
         # Try without API key first (should fail if auth is enabled)
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/v1/messages",
-            json={
-                "model": "l",
-                "max_tokens": 10,
-                "messages": [{"role": "user", "content": "test"}]
-            },
+            data=_PROBE_BODY,
+            headers=_PROBE_HEADERS,
             timeout=5
         )
         
@@ -124,14 +207,10 @@ def test_api_key_auth() -> bool:
             print_info("API key authentication is ENABLED (401 without key)")
             
             # Now try with API key
-            response_with_key = requests.post(
+            response_with_key = SESSION.post(
                 f"{BASE_URL}/v1/messages",
-                headers={"Authorization": f"Bearer {API_KEY}"},
-                json={
-                    "model": "l",
-                    "max_tokens": 10,
-                    "messages": [{"role": "user", "content": "test"}]
-                },
+                data=_PROBE_BODY,
+                headers=_PROBE_HEADERS_AUTH,
                 timeout=30
             )
             
@@ -156,12 +235,7 @@ def test_model_nonstreaming(nickname: str, prompt: str) -> bool:
     print_info(f"Prompt: {prompt}")
     
     try:
-        client = Anthropic(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        
-        message = client.messages.create(
+        message = NO_RETRY_CLIENT.messages.create(
             model=nickname,
             max_tokens=100,
             messages=[{"role": "user", "content": prompt}],
@@ -187,47 +261,106 @@ def test_model_nonstreaming(nickname: str, prompt: str) -> bool:
         return False
 
 # Test 5: Streaming Request
-def test_model_streaming(nickname: str, prompt: str) -> bool:
-    """Test a model with streaming request"""
+def test_model_streaming(nickname: str, prompt: str, deadline: Optional[float] = None) -> bool:
+    """Test a model with streaming request, giving up once deadline passes"""
     print_header(f"Test 5: Streaming Request - Model '{nickname}'")
     print_info(f"Prompt: {prompt}")
     
+    # Cap every network wait at the time left, so a stall before the first
+    # byte or between chunks raises APITimeoutError instead of running on
+    timeout = NO_RETRY_CLIENT.timeout
+    if deadline is not None:
+        timeout = httpx.Timeout(max(0.1, deadline - time.monotonic()))
+    
     try:
-        client = Anthropic(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        
-        chunks = []
-        sys.stdout.write(f"{Colors.BLUE}ℹ️  Streaming response: {Colors.RESET}")
+        buf = io.StringIO()
+        timed_out = False
+        sys.stdout.write(f"{_INFO_PREFIX}Streaming response: {Colors.RESET}")
         sys.stdout.flush()
         
-        with client.messages.stream(
+        with NO_RETRY_CLIENT.messages.stream(
             model=nickname,
             max_tokens=100,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout
         ) as stream:
-            for text in stream.text_stream:
-                chunks.append(text)
+            for i, text in enumerate(stream.text_stream, 1):
+                # Backstop for a stream that keeps trickling chunks in just
+                # under the read timeout
+                if deadline is not None and time.monotonic() > deadline:
+                    timed_out = True
+                    break
+                buf.write(text)
                 sys.stdout.write(text)
-                sys.stdout.flush()
-        
-        print()  # New line after streaming
-        
-        full_response = "".join(chunks)
-        if full_response:
-            print_success(f"Streaming request succeeded")
-            print_info(f"Total characters received: {len(full_response)}")
-            return True
-        else:
-            print_error("Streaming request returned empty response")
-            return False
+                # Flush in batches rather than once per token
+                if i % 16 == 0:
+                    sys.stdout.flush()
         
+    except APITimeoutError:
+        timed_out = True
     except Exception as e:
+        print()
         print_error(f"Streaming request failed: {e}")
         return False
+    
+    print()  # New line after streaming
+    
+    if timed_out:
+        print_error(f"Streaming request TIMED OUT after {TEST_TIMEOUT}s")
+        return False
+    
+    full_response = buf.getvalue()
+    if full_response:
+        print_success(f"Streaming request succeeded")
+        print_info(f"Total characters received: {len(full_response)}")
+        return True
+    else:
+        print_error("Streaming request returned empty response")
+        return False
 
 # Test 6: Model Nicknames
+@lru_cache(maxsize=None)
+def resolve_nickname(nickname: str) -> None:
+    """Check that a nickname resolves, raising if it does not
+
+    Uses the proxy's GET /v1/models/{nickname} lookup, which costs one round
+    trip and no tokens. An unknown nickname gets a JSON not_found_error from
+    that route; older proxies without the route answer a bare 404/405, and
+    only then do we fall back to a 1-token request. lru_cache does not cache
+    exceptions, so only successful lookups are remembered.
+    """
+    response = SESSION.get(
+        f"{BASE_URL}/v1/models/{nickname}",
+        headers=_PROBE_HEADERS_AUTH,
+        timeout=3
+    )
+    if response.status_code == 200:
+        return
+    if response.status_code not in (404, 405):
+        raise Exception(f"{response.status_code}: {response.text}")
+    
+    try:
+        error = response.json().get("error", {})
+    except ValueError:
+        error = {}
+    if error.get("type") == "not_found_error":
+        raise Exception(error.get("message", "Unknown model nickname"))
+    
+    # Route missing - let a real request decide
+    NO_RETRY_CLIENT.messages.create(
+        model=nickname,
+        max_tokens=1,
+        messages=[{"role": "user", "content": "."}]
+    )
+
+def probe_nickname(nickname: str) -> Tuple[str, bool, Optional[Exception]]:
+    """Probe a nickname, returning (nickname, ok, error)"""
+    try:
+        resolve_nickname(nickname)
+        return nickname, True, None
+    except Exception as e:
+        return nickname, False, e
+
 def test_model_nicknames() -> bool:
     """Test various model nicknames"""
     print_header("Test 6: Model Nicknames Resolution")
@@ -235,30 +368,21 @@ def test_model_nicknames() -> bool:
     nicknames = ["xs", "s", "m", "l", "xl", "xxl"]
     success_count = 0
     
-    for nickname in nicknames:
+    # Probe all nicknames concurrently, then report in the original order
+    with ThreadPoolExecutor(max_workers=len(nicknames)) as executor:
+        probes = list(executor.map(probe_nickname, nicknames))
+    
+    for nickname, ok, error in probes:
         print_info(f"Testing nickname: {nickname}")
-        try:
-            client = Anthropic(
-                api_key=API_KEY,
-                base_url=BASE_URL
-            )
-            
-            # Very short request to test nickname resolution
-            message = client.messages.create(
-                model=nickname,
-                max_tokens=10,
-                messages=[{"role": "user", "content": "Hi"}]
-            )
-            
+        if ok:
             print_success(f"Nickname '{nickname}' resolved successfully")
             success_count += 1
-            
-        except Exception as e:
-            error_msg = str(e)
+        else:
+            error_msg = str(error)
             if "invalid_request_error" in error_msg.lower() or "not found" in error_msg.lower():
                 print_warning(f"Nickname '{nickname}' - Model not available in your subscription")
             else:
-                print_error(f"Nickname '{nickname}' failed: {e}")
+                print_error(f"Nickname '{nickname}' failed: {error}")
     
     if success_count > 0:
         print_success(f"{success_count}/{len(nicknames)} nicknames tested successfully")
@@ -273,12 +397,7 @@ def test_extended_thinking() -> bool:
     print_header("Test 7: Extended Thinking Mode")
     
     try:
-        client = Anthropic(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        
-        message = client.messages.create(
+        message = NO_RETRY_CLIENT.messages.create(
             model="l",  # Sonnet 4 supports thinking
             max_tokens=2000,
             thinking={
@@ -320,36 +439,81 @@ def main():
     print(f"API Key: {'*' * (len(API_KEY) - 4) + API_KEY[-4:] if len(API_KEY) > 4 else 'dummy'}")
     print(f"{'='*70}{Colors.RESET}")
     
-    # Run all tests
-    tests = [
-        ("Health Check", test_health_check),
+    # Health check gates everything else: if the proxy is down, every other
+    # test would just fail the same way after waiting out its timeout
+    if not test_health_check():
+        print()
+        print_error("Proxy is not healthy, skipping remaining tests")
+        sys.exit(1)
+    # Names and outcomes are kept in parallel lists so the pass count is a
+    # plain sum over booleans
+    names = ["Health Check"]
+    successes = [True]
+    
+    def record(name: str, success: bool):
+        names.append(name)
+        successes.append(success)
+    
+    # Independent tests run concurrently; their output is buffered and
+    # printed in order once each one finishes
+    independent_tests = [
         ("Auth Status", test_auth_status),
         ("API Key Auth", test_api_key_auth),
         ("Non-Streaming", lambda: test_model_nonstreaming("l", "Say hello in 3 words")),
-        ("Streaming", lambda: test_model_streaming("m", "Count to 5")),
         ("Model Nicknames", test_model_nicknames),
         ("Extended Thinking", test_extended_thinking),
     ]
     
-    results = []
-    for name, test_func in tests:
-        try:
-            success = test_func()
-            results.append((name, success))
-        except KeyboardInterrupt:
-            print_error("\nTest interrupted by user")
-            sys.exit(1)
-        except Exception as e:
-            print_error(f"Test '{name}' crashed: {e}")
-            results.append((name, False))
+    # Streaming writes to stdout incrementally, so it runs on the main thread
+    # afterwards and enforces its own deadline between chunks
+    sequential_tests = [
+        ("Streaming", lambda: test_model_streaming(
+            "m", "Count to 5", deadline=time.monotonic() + TEST_TIMEOUT
+        )),
+    ]
+    
+    executor = ThreadPoolExecutor(max_workers=len(independent_tests))
+    try:
+        # The independent tests all start together, so they share one deadline
+        deadline = time.monotonic() + TEST_TIMEOUT
+        futures = []
+        for name, test_func in independent_tests:
+            lines = []
+            futures.append((name, lines, executor.submit(run_captured, name, test_func, lines)))
+        for name, lines, future in futures:
+            try:
+                success = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FuturesTimeoutError:
+                success = None
+            # Copy first: a timed-out test may still be appending
+            for line in list(lines):
+                print(line)
+            if success is None:
+                print_error(f"Test '{name}' TIMED OUT after {TEST_TIMEOUT}s")
+                success = False
+            record(name, success)
+        
+        for name, test_func in sequential_tests:
+            try:
+                success = test_func()
+            except Exception as e:
+                print_error(f"Test '{name}' crashed: {e}")
+                success = False
+            record(name, success)
+    except KeyboardInterrupt:
+        print_error("\nTest interrupted by user")
+        sys.exit(1)
+    finally:
+        # Don't wait here on tests that timed out; see the os._exit below
+        executor.shutdown(wait=False, cancel_futures=True)
     
     # Summary
     print_header("📊 Test Summary")
     
-    passed = sum(1 for _, success in results if success)
-    total = len(results)
+    passed = sum(successes)
+    total = len(successes)
     
-    for name, success in results:
+    for name, success in zip(names, successes):
         if success:
             print_success(f"{name}")
         else:
@@ -362,7 +526,7 @@ def main():
         print(f"\n{Colors.YELLOW}{Colors.BOLD}💡 Troubleshooting Tips:{Colors.RESET}")
         
         # Check for auth failures
-        auth_failures = [name for name, success in results if not success and name not in ["Health Check", "Auth Status", "API Key Auth"]]
+        auth_failures = [name for name, success in zip(names, successes) if not success and name not in ["Health Check", "Auth Status", "API Key Auth"]]
         if auth_failures:
             print(f"\n{Colors.YELLOW}If seeing 'Invalid bearer token' errors:{Colors.RESET}")
             print("  1. Your OAuth tokens might be invalid or expired")
@@ -386,8 +550,20 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    exit_code = 0
     try:
         main()
+    except SystemExit as e:
+        exit_code = e.code or 0
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}Test suite interrupted{Colors.RESET}")
-        sys.exit(1)
+        exit_code = 1
+    finally:
+        CLIENT.close()
+        SESSION.close()
+        HEALTH_SESSION.close()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    # Worker threads of timed-out tests may still be blocked on the network,
+    # and the interpreter joins them on a normal exit
+    os._exit(exit_code)